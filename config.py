@@ -8,12 +8,27 @@ PARALLAX_TIMEOUT = 120
 PREVIEW_CHARS = 400
 MAX_FILE_CHARS = 200_000
 
+# Candidates passed from TF-IDF retrieval to the model in hybrid search
+HYBRID_TOP_K = 100
+
+# Files per model request in full AI search
+FULL_SEARCH_BATCH_SIZE = 300
+# Extra attempts per full-search batch on model errors (exponential backoff)
+FULL_SEARCH_RETRIES = 2
+
 PARALLAX_SYSTEM_PROMPT = (
     "You are a helpful assistant. "
     "Analyze the provided file candidates and select the ones that match the user's query. "
     "Return a JSON object with 'ranked' (list of file paths in order of relevance) and 'reasoning' (brief explanation)."
 )
 
+PARALLAX_MULTI_QUERY_SYSTEM_PROMPT = (
+    "You are a helpful assistant. "
+    "Analyze the provided file candidates and, for each numbered query, select the ones that match it. "
+    "Return a JSON object with 'results' mapping each query number to an object with 'ranked' "
+    "(list of file paths in order of relevance) and 'reasoning' (brief explanation)."
+)
+
 THEME = {
     "bg": "#000000",
     "panel_bg": "#1A1A1A",
@@ -30,3 +45,52 @@ THEME = {
 FONT_FAMILY = "Segoe UI"
 
 ALLOWED_EXTENSIONS = {'.txt', '.md', '.log', '.py', '.json', '.csv', '.js', '.html', '.css'}
+
+# Directory pruning: .gitignore-style patterns skipped during indexing
+RESPECT_GITIGNORE = True
+EXCLUDE_PATTERNS = [
+    ".git/", ".hg/", ".svn/",
+    "node_modules/", "bower_components/",
+    "venv/", ".venv/", "__pycache__/", ".tox/", ".mypy_cache/", ".pytest_cache/",
+    "*.min.js", "*.min.css", "*.map",
+    "package-lock.json", "yarn.lock",
+]
+
+# Content sniffing: first bytes are checked for binary, minified or generated content
+SNIFF_BYTES = 8192
+BINARY_CONTROL_RATIO = 0.30
+MINIFIED_LINE_LENGTH = 1000
+MINIFIED_AVG_LINE_LENGTH = 300
+MINIFIED_LONG_LINE_SHARE = 0.5
+MINIFIED_CHECK_EXTENSIONS = {'.js', '.css', '.json', '.html'}
+GENERATED_MARKERS = ("@generated", "do not edit", "auto-generated", "autogenerated")
+GENERATED_CHECK_EXTENSIONS = {'.py', '.js', '.json', '.css', '.html'}
+GENERATED_HEADER_LINES = 5
+COMMENT_PREFIXES = ("#", "//", "/*", "*", "<!--")
+
+# Files above these sizes are not indexed at all
+DEFAULT_MAX_FILE_BYTES = 10 * 1024 * 1024
+MAX_FILE_BYTES_BY_EXT = {
+    '.log': 50 * 1024 * 1024,
+    '.csv': 20 * 1024 * 1024,
+    '.json': 2 * 1024 * 1024,
+    '.js': 1 * 1024 * 1024,
+    '.css': 1 * 1024 * 1024,
+}
+
+# Sharded index: files per shard and worker processes (None = one per CPU core)
+SHARD_MAX_FILES = 5000
+SHARD_WORKERS = None
+
+# Duplicate collapsing: files within this SimHash distance count as near duplicates (-1 = exact only)
+SIMHASH_MAX_DISTANCE = 3
+SIMHASH_CHARS = 20_000
+SIMHASH_MIN_TOKENS = 20
+
+# search_many: queries retrieved per pipeline step, model requests in flight,
+# and how queries are packed into shared model requests
+SEARCH_MANY_CHUNK = 32
+SEARCH_MANY_WORKERS = 3
+SHARED_BATCH_MIN_OVERLAP = 0.5
+SHARED_BATCH_MAX_QUERIES = 8
+SHARED_BATCH_MAX_CANDIDATES = 300
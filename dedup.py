@@ -0,0 +1,120 @@
+"""
+dedup.py - Content hashes, SimHash signatures and duplicate clustering
+"""
+
+import re
+import hashlib
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from models import IndexedFile, SearchResult
+import config
+
+_TOKEN_RE = re.compile(r"\w+")
+_SIMHASH_BANDS = 4
+_BAND_BITS = 64 // _SIMHASH_BANDS
+
+
+def content_hash(data: bytes) -> str:
+    return hashlib.blake2b(data, digest_size=16).hexdigest()
+
+
+def simhash(text: str) -> int:
+    """64-bit SimHash over word 3-shingles of the first SIMHASH_CHARS chars."""
+    tokens = _TOKEN_RE.findall(text[:config.SIMHASH_CHARS].lower())
+    if len(tokens) < config.SIMHASH_MIN_TOKENS:
+        return 0
+
+    shingles = {" ".join(tokens[i:i + 3]) for i in range(len(tokens) - 2)}
+    digests = b"".join(hashlib.blake2b(s.encode("utf-8"), digest_size=8).digest() for s in shingles)
+    bits = np.unpackbits(np.frombuffer(digests, dtype=np.uint8).reshape(-1, 8), axis=1)
+
+    # Majority vote per bit position
+    votes = bits.sum(axis=0) * 2 > len(shingles)
+    return int.from_bytes(np.packbits(votes).tobytes(), "big")
+
+
+def fingerprint(text: str) -> Tuple[str, int]:
+    return content_hash(text.encode("utf-8")), simhash(text)
+
+
+def _find(parent: List[int], i: int) -> int:
+    while parent[i] != i:
+        parent[i] = parent[parent[i]]
+        i = parent[i]
+    return i
+
+
+class DuplicateIndex:
+    """Groups exact and near duplicates of an index into clusters."""
+
+    def __init__(self, files: List[IndexedFile], max_distance: int = config.SIMHASH_MAX_DISTANCE):
+        self.files = files
+        parent = list(range(len(files)))
+
+        def union(a: int, b: int) -> None:
+            ra, rb = _find(parent, a), _find(parent, b)
+            if ra != rb:
+                parent[max(ra, rb)] = min(ra, rb)
+
+        exact: Dict[Tuple[int, str], int] = {}
+        for i, f in enumerate(files):
+            if not f.content_hash:
+                f.content_hash, f.simhash = fingerprint(f.content)
+            key = (f.size_bytes, f.content_hash)
+            if key in exact:
+                union(exact[key], i)
+            else:
+                exact[key] = i
+
+        if max_distance >= 0:
+            # Pigeonhole: signatures within max_distance < bands share at least one band
+            buckets: Dict[Tuple[int, int], List[int]] = {}
+            mask = (1 << _BAND_BITS) - 1
+            for i, f in enumerate(files):
+                if not f.simhash:
+                    continue
+                for band in range(_SIMHASH_BANDS):
+                    buckets.setdefault((band, (f.simhash >> (band * _BAND_BITS)) & mask), []).append(i)
+
+            for members in buckets.values():
+                for a_pos, a in enumerate(members):
+                    for b in members[a_pos + 1:]:
+                        if _find(parent, a) == _find(parent, b):
+                            continue
+                        if bin(files[a].simhash ^ files[b].simhash).count("1") <= max_distance:
+                            union(a, b)
+
+        self.cluster_ids = np.array([_find(parent, i) for i in range(len(files))], dtype=np.int64)
+        self._members: Dict[int, List[int]] = {}
+        for i, cid in enumerate(self.cluster_ids):
+            self._members.setdefault(int(cid), []).append(i)
+        self._position = {id(f): i for i, f in enumerate(files)}
+
+    def __len__(self) -> int:
+        return len(self.files)
+
+    @property
+    def cluster_count(self) -> int:
+        return len(self._members)
+
+    def representatives(self, mask: Optional[np.ndarray] = None) -> np.ndarray:
+        """Boolean mask keeping the first file of each cluster among ``mask``."""
+        candidates = np.arange(len(self.files)) if mask is None else np.flatnonzero(mask)
+        _, first = np.unique(self.cluster_ids[candidates], return_index=True)
+        keep = np.zeros(len(self.files), dtype=bool)
+        keep[candidates[first]] = True
+        return keep
+
+    def expand(self, results: List[SearchResult], mask: Optional[np.ndarray] = None) -> List[SearchResult]:
+        """Attach the other members of each result's cluster as duplicates."""
+        for res in results:
+            pos = self._position.get(id(res.file))
+            if pos is None:
+                continue
+            res.duplicates = [
+                self.files[i] for i in self._members[int(self.cluster_ids[pos])]
+                if i != pos and (mask is None or mask[i])
+            ]
+        return results
@@ -0,0 +1,117 @@
+"""
+ignore_rules.py - .gitignore-style path matching used to prune the index walk
+"""
+
+import os
+import re
+from typing import Iterable, List, Optional, Tuple
+
+GITIGNORE_NAME = ".gitignore"
+
+
+def _translate(pattern: str) -> str:
+    """Translate one gitignore glob into a regex body (no anchors)."""
+    out = []
+    i, n = 0, len(pattern)
+    while i < n:
+        c = pattern[i]
+        if pattern.startswith("**/", i):
+            out.append("(?:.*/)?")
+            i += 3
+        elif pattern.startswith("/**", i) and i + 3 == n:
+            out.append("/.*")
+            i += 3
+        elif pattern.startswith("**", i):
+            out.append(".*")
+            i += 2
+        elif c == "*":
+            out.append("[^/]*")
+            i += 1
+        elif c == "?":
+            out.append("[^/]")
+            i += 1
+        elif c == "[":
+            end = pattern.find("]", i + 1)
+            if end == -1:
+                out.append(re.escape(c))
+                i += 1
+            else:
+                body = pattern[i + 1:end]
+                if body.startswith("!"):
+                    body = "^" + body[1:]
+                out.append("[" + body.replace("\\", "\\\\") + "]")
+                i = end + 1
+        else:
+            out.append(re.escape(c))
+            i += 1
+    return "".join(out)
+
+
+class IgnoreRule:
+    def __init__(self, pattern: str):
+        self.negate = pattern.startswith("!")
+        if self.negate:
+            pattern = pattern[1:]
+        self.dir_only = pattern.endswith("/")
+        pattern = pattern.rstrip("/")
+        # A slash anywhere but the end anchors the pattern to its base directory
+        anchored = "/" in pattern
+        pattern = pattern.lstrip("/")
+        prefix = "" if anchored else "(?:.*/)?"
+        self.regex = re.compile(prefix + _translate(pattern) + r"\Z", re.DOTALL)
+
+    def matches(self, rel_path: str, is_dir: bool) -> bool:
+        if self.dir_only and not is_dir:
+            return False
+        return self.regex.match(rel_path) is not None
+
+
+def parse_rules(lines: Iterable[str]) -> List[IgnoreRule]:
+    rules = []
+    for line in lines:
+        line = line.rstrip("\r\n")
+        if not line.strip() or line.startswith("#"):
+            continue
+        line = line.rstrip(" ")
+        if line.startswith("\\"):
+            line = line[1:]
+        try:
+            rules.append(IgnoreRule(line))
+        except re.error:
+            # Like git, skip a malformed pattern instead of failing the walk
+            continue
+    return rules
+
+
+class IgnoreMatcher:
+    """Stack of rule sets, each scoped to the directory that declared it."""
+
+    def __init__(self, patterns: Optional[Iterable[str]] = None):
+        self._scopes: List[Tuple[str, List[IgnoreRule]]] = []
+        if patterns:
+            self._scopes.append(("", parse_rules(patterns)))
+
+    def add_gitignore(self, rel_dir: str, gitignore_path: str) -> None:
+        try:
+            with open(gitignore_path, "r", encoding="utf-8", errors="ignore") as fh:
+                rules = parse_rules(fh)
+        except OSError:
+            return
+        if rules:
+            self._scopes.append((rel_dir, rules))
+
+    def is_ignored(self, rel_path: str, is_dir: bool) -> bool:
+        rel_path = rel_path.replace(os.sep, "/")
+        ignored = False
+        # Later (deeper) scopes and later rules take precedence, as in git
+        for base, rules in self._scopes:
+            if base:
+                if not rel_path.startswith(base + "/"):
+                    continue
+                sub_path = rel_path[len(base) + 1:]
+            else:
+                sub_path = rel_path
+            for rule in rules:
+                if rule.matches(sub_path, is_dir):
+                    ignored = not rule.negate
+        return ignored
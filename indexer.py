@@ -2,12 +2,17 @@ import os
 import json
 from typing import List, Optional, Callable
 from models import IndexedFile
+from ignore_rules import GITIGNORE_NAME, IgnoreMatcher
+from dedup import fingerprint
 import config
 
 class FileIndexer:
     def __init__(self):
         self.root_path = ""
         self._index = []
+        self.exclude_patterns = list(config.EXCLUDE_PATTERNS)
+        self.respect_gitignore = config.RESPECT_GITIGNORE
+        self.skipped_count = 0
 
     def set_root_path(self, path: str) -> None:
         self.root_path = path
@@ -18,11 +23,27 @@ class FileIndexer:
 
         indexed_files = []
         count = 0
+        self.skipped_count = 0
+        matcher = IgnoreMatcher(self.exclude_patterns)
         
-        for root, _, files in os.walk(self.root_path):
+        for root, dirs, files in os.walk(self.root_path):
+            rel_root = os.path.relpath(root, self.root_path).replace(os.sep, "/")
+            rel_root = "" if rel_root == "." else rel_root
+
+            if self.respect_gitignore and GITIGNORE_NAME in files:
+                matcher.add_gitignore(rel_root, os.path.join(root, GITIGNORE_NAME))
+
+            # Prune in place so excluded subtrees are never walked
+            dirs[:] = [
+                d for d in dirs
+                if not matcher.is_ignored(f"{rel_root}/{d}" if rel_root else d, is_dir=True)
+            ]
+
             for filename in files:
                 ext = os.path.splitext(filename)[1].lower()
                 if ext in config.ALLOWED_EXTENSIONS:
+                    if matcher.is_ignored(f"{rel_root}/{filename}" if rel_root else filename, is_dir=False):
+                        continue
                     full_path = os.path.join(root, filename)
                     
                     if progress_callback and count % 10 == 0:
@@ -33,24 +54,36 @@ class FileIndexer:
                         if indexed_file:
                             indexed_files.append(indexed_file)
                             count += 1
+                        else:
+                            self.skipped_count += 1
                     except Exception:
                         pass
 
         self._index = indexed_files
         if progress_callback:
-            progress_callback(f"Indexing complete: {count} files found.")
+            progress_callback(f"Indexing complete: {count} files found ({self.skipped_count} skipped).")
             
         return indexed_files
 
     def _process_file(self, path: str, name: str, ext: str) -> Optional[IndexedFile]:
         try:
             stats = os.stat(path)
+            if stats.st_size > config.MAX_FILE_BYTES_BY_EXT.get(ext, config.DEFAULT_MAX_FILE_BYTES):
+                return None
+
+            with open(path, 'rb') as f:
+                head = f.read(config.SNIFF_BYTES)
+            if self._should_skip_content(head, ext):
+                return None
+
+            # Text mode for the real read: universal newlines and a character limit
             with open(path, 'r', encoding='utf-8', errors='ignore') as f:
                 content = f.read(config.MAX_FILE_CHARS)
             
             preview = content[:config.PREVIEW_CHARS].replace('\n', ' ').strip()
             if len(content) > config.PREVIEW_CHARS:
                 preview += "..."
+            digest, signature = fingerprint(content)
 
             return IndexedFile(
                 path=path,
@@ -59,13 +92,50 @@ class FileIndexer:
                 size_bytes=stats.st_size,
                 modified_time=stats.st_mtime,
                 content=content,
-                preview=preview
+                preview=preview,
+                content_hash=digest,
+                simhash=signature
             )
         except Exception:
             return None
 
-    def save_index(self, path: str) -> None:
-        data = [f.as_dict() for f in self._index]
+    def _should_skip_content(self, head: bytes, ext: str) -> bool:
+        if not head:
+            return False
+        if b"\0" in head:
+            return True
+
+        # Control bytes other than common whitespace indicate binary data
+        control = sum(1 for b in head if b < 32 and b not in (9, 10, 12, 13))
+        if control / len(head) > config.BINARY_CONTROL_RATIO:
+            return True
+
+        text = head.decode('utf-8', errors='ignore')
+        if ext in config.GENERATED_CHECK_EXTENSIONS and self._has_generated_header(text):
+            return True
+
+        if ext in config.MINIFIED_CHECK_EXTENSIONS:
+            # Judge the whole sample, so one long paragraph or string value
+            # in an otherwise ordinary file does not count as minified
+            lines = text.splitlines() or [""]
+            total = sum(len(line) for line in lines)
+            long_chars = sum(len(line) for line in lines if len(line) > config.MINIFIED_LINE_LENGTH)
+            if (total / len(lines) > config.MINIFIED_AVG_LINE_LENGTH
+                    and long_chars > config.MINIFIED_LONG_LINE_SHARE * total):
+                return True
+
+        return False
+
+    def _has_generated_header(self, text: str) -> bool:
+        # Only comment lines at the top count, so prose mentioning the phrases is kept
+        for line in text.splitlines()[:config.GENERATED_HEADER_LINES]:
+            line = line.strip().lower()
+            if line.startswith(config.COMMENT_PREFIXES) and any(m in line for m in config.GENERATED_MARKERS):
+                return True
+        return False
+
+    def save_index(self, path: str, files: Optional[List[IndexedFile]] = None) -> None:
+        data = [f.as_dict() for f in (self._index if files is None else files)]
         with open(path, "w", encoding="utf-8") as fh:
             json.dump(data, fh, indent=2)
 
@@ -86,6 +156,8 @@ class FileIndexer:
                 modified_time=item.get("modified_time", 0),
                 content=content,
                 preview=preview,
+                content_hash=item.get("content_hash", ""),
+                simhash=item.get("simhash", 0),
             )
             self._index.append(idx)
 
@@ -1,4 +1,6 @@
-from dataclasses import dataclass
+from dataclasses import dataclass, field
+from typing import List
+import config
 
 @dataclass
 class IndexedFile:
@@ -9,6 +11,18 @@ class IndexedFile:
     modified_time: float
     content: str
     preview: str = ""
+    content_hash: str = ""
+    simhash: int = 0
+    candidate_block: str = field(default="", repr=False, compare=False)
+
+    def __post_init__(self):
+        # Rendered once so prompts reuse the exact same bytes on every query
+        if not self.candidate_block:
+            self.candidate_block = self.render_candidate_block()
+
+    def render_candidate_block(self) -> str:
+        preview = self.preview.replace('\n', ' ')[:config.PREVIEW_CHARS]
+        return f"ID: {self.path}\nName: {self.name}\nPreview: {preview}\n\n"
 
     def as_dict(self):
         return {
@@ -18,10 +32,16 @@ class IndexedFile:
             "size_bytes": self.size_bytes,
             "modified_time": self.modified_time,
             "content": self.content,
-            "preview": self.preview
+            "preview": self.preview,
+            "content_hash": self.content_hash,
+            "simhash": self.simhash
         }
 
+    def search_text(self, limit: int = 1000) -> str:
+        return f"{self.path}\n{self.content[:limit]}"
+
 @dataclass
 class SearchResult:
     file: IndexedFile
     score: float
+    duplicates: List[IndexedFile] = field(default_factory=list)
@@ -0,0 +1,141 @@
+"""
+query_filters.py - Structured metadata filters (ext:, size:, modified:, path:)
+"""
+
+import os
+import re
+import time
+import fnmatch
+from dataclasses import dataclass
+from typing import List, Tuple
+
+import numpy as np
+
+from models import IndexedFile
+
+FILTER_KEYS = ("ext", "size", "modified", "path")
+
+_FILTER_RE = re.compile(r"^(ext|size|modified|path):(\S+)$", re.IGNORECASE)
+_COMPARE_RE = re.compile(r"^(<=|>=|<|>|=)?\s*([0-9]*\.?[0-9]+)\s*([a-zA-Z]*)$")
+
+SIZE_UNITS = {
+    "": 1,
+    "b": 1,
+    "k": 1024,
+    "kb": 1024,
+    "m": 1024 ** 2,
+    "mb": 1024 ** 2,
+    "g": 1024 ** 3,
+    "gb": 1024 ** 3,
+}
+
+AGE_UNITS = {
+    "s": 1,
+    "m": 60,
+    "h": 3600,
+    "d": 86400,
+    "w": 7 * 86400,
+    "y": 365 * 86400,
+}
+
+
+@dataclass
+class QueryFilter:
+    key: str
+    op: str
+    value: object
+
+
+def _parse_compare(raw: str, units: dict, default_unit: str) -> Tuple[str, float]:
+    match = _COMPARE_RE.match(raw)
+    if not match:
+        raise ValueError(f"Invalid filter value: {raw}")
+    op, number, unit = match.groups()
+    unit = (unit or default_unit).lower()
+    if unit not in units:
+        raise ValueError(f"Unknown unit '{unit}' in filter value: {raw}")
+    return op or "<=", float(number) * units[unit]
+
+
+def parse_query(query: str) -> Tuple[str, List[QueryFilter]]:
+    """Split a raw query into free text and structured metadata filters."""
+    terms = []
+    filters = []
+
+    for token in query.split():
+        match = _FILTER_RE.match(token)
+        if not match:
+            terms.append(token)
+            continue
+
+        key, raw = match.group(1).lower(), match.group(2)
+        if key == "ext":
+            exts = {"." + e.lower().lstrip(".") for e in raw.split(",") if e.strip(".")}
+            filters.append(QueryFilter(key, "in", exts))
+        elif key == "size":
+            op, value = _parse_compare(raw, SIZE_UNITS, "b")
+            filters.append(QueryFilter(key, op, value))
+        elif key == "modified":
+            op, value = _parse_compare(raw, AGE_UNITS, "d")
+            filters.append(QueryFilter(key, op, value))
+        else:
+            pattern = raw.replace("\\", "/")
+            # Anchor at any path component so "src/**" matches ".../project/src/a.py"
+            regex = re.compile(r"(?:^|/)" + fnmatch.translate(pattern), re.IGNORECASE)
+            filters.append(QueryFilter(key, "glob", regex))
+
+    return " ".join(terms), filters
+
+
+def _compare(column: np.ndarray, op: str, value: float) -> np.ndarray:
+    if op == "<":
+        return column < value
+    if op == ">":
+        return column > value
+    if op == ">=":
+        return column >= value
+    if op == "=":
+        return column == value
+    return column <= value
+
+
+class MetadataColumns:
+    """Columnar view over an index so filters run as vectorized masks."""
+
+    def __init__(self, files: List[IndexedFile]):
+        self.files = files
+        self.extensions = np.array([f.extension.lower() for f in files], dtype=object)
+        self.sizes = np.array([f.size_bytes for f in files], dtype=np.int64)
+        self.mtimes = np.array([f.modified_time for f in files], dtype=np.float64)
+        self.paths = np.array([f.path.replace(os.sep, "/") for f in files], dtype=object)
+
+    def __len__(self) -> int:
+        return len(self.files)
+
+    def mask(self, filters: List[QueryFilter], now: float = None) -> np.ndarray:
+        mask = np.ones(len(self.files), dtype=bool)
+        now = time.time() if now is None else now
+
+        for flt in filters:
+            if flt.key == "ext":
+                mask &= np.isin(self.extensions, list(flt.value))
+            elif flt.key == "size":
+                mask &= _compare(self.sizes, flt.op, flt.value)
+            elif flt.key == "modified":
+                mask &= _compare(now - self.mtimes, flt.op, flt.value)
+            elif flt.key == "path":
+                # Only test paths still in the running mask
+                candidates = np.flatnonzero(mask)
+                hits = np.fromiter(
+                    (flt.value.search(p) is not None for p in self.paths[candidates]),
+                    dtype=bool,
+                    count=len(candidates),
+                )
+                mask[candidates] = hits
+
+        return mask
+
+    def select(self, filters: List[QueryFilter]) -> List[IndexedFile]:
+        if not filters:
+            return self.files
+        return [self.files[i] for i in np.flatnonzero(self.mask(filters))]
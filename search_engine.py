@@ -1,40 +1,54 @@
 import json
-from typing import List, Tuple
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Tuple
+import numpy as np
 from models import IndexedFile, SearchResult
 from parallax_client import ParallaxClient
+from query_filters import MetadataColumns, parse_query
+from sharded_index import ShardedIndex
+from dedup import DuplicateIndex
 import config
 from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.metrics.pairwise import cosine_similarity
 
 class SearchEngine:
     def __init__(self):
         self.parallax_client = ParallaxClient()
+        self._columns = None
+        self._duplicates = None
+        self._tfidf = None
 
-    def semantic_search(self, query: str, documents: List[IndexedFile], top_k: int = 100) -> List[IndexedFile]:
-        if not documents:
-            return []
+    def _metadata_columns(self, files: List[IndexedFile]) -> MetadataColumns:
+        # Rebuild the columnar view only when a different index is searched
+        if self._columns is None or self._columns.files is not files or len(self._columns) != len(files):
+            self._columns = MetadataColumns(files)
+        return self._columns
 
-        doc_texts = [f"{d.path}\n{d.content[:1000]}" for d in documents]
-        
-        vectorizer = TfidfVectorizer()
-        try:
-            tfidf_matrix = vectorizer.fit_transform([query] + doc_texts)
-        except ValueError:
-            return []
+    def _duplicate_index(self, files: List[IndexedFile]) -> DuplicateIndex:
+        if self._duplicates is None or self._duplicates.files is not files or len(self._duplicates) != len(files):
+            self._duplicates = DuplicateIndex(files)
+        return self._duplicates
 
-        cosine_similarities = cosine_similarity(tfidf_matrix[0:1], tfidf_matrix[1:]).flatten()
-        
-        related_docs_indices = cosine_similarities.argsort()[::-1]
-        
-        top_docs = []
-        for i in related_docs_indices[:top_k]:
-            if cosine_similarities[i] > 0:
-                top_docs.append(documents[i])
-        
-        if not top_docs:
-            return []
+    def _sharded_duplicates(self, index: ShardedIndex, duplicates: DuplicateIndex) -> None:
+        # Hide non-representatives inside the workers once per index, so
+        # unfiltered queries need no per-query mask
+        if index.hidden_for is not duplicates.files:
+            index.set_hidden(~duplicates.representatives())
 
-        return top_docs
+    def _tfidf_index(self, files: List[IndexedFile], duplicates: DuplicateIndex):
+        # Document matrix built once per index. IDF is fitted on one file per
+        # duplicate cluster so copies do not skew term weights; every file
+        # still gets a row so filtered queries can pick any cluster member.
+        if self._tfidf is None or self._tfidf[0] is not files or self._tfidf[1] != len(files):
+            texts = [d.search_text() for d in files]
+            vectorizer = TfidfVectorizer()
+            try:
+                vectorizer.fit([texts[i] for i in duplicates.representatives().nonzero()[0]])
+                matrix = vectorizer.transform(texts).tocsr()
+            except ValueError:
+                matrix = None
+            self._tfidf = (files, len(files), vectorizer, matrix)
+        return self._tfidf[2], self._tfidf[3]
 
     def ai_search_full(self, query: str, files: List[IndexedFile], max_results: int = 20) -> Tuple[List[SearchResult], str]:
         if not files:
@@ -42,31 +56,21 @@ class SearchEngine:
         
         from concurrent.futures import ThreadPoolExecutor, as_completed
         
-        batch_size = 300
+        # Fixed-size batches over the index order keep batch membership (and
+        # therefore the prompt prefix) identical across queries
+        batch_size = config.FULL_SEARCH_BATCH_SIZE
         batches = [files[i:i + batch_size] for i in range(0, len(files), batch_size)]
         
         all_results = []
         
         def process_batch(batch_data):
             batch_idx, batch = batch_data
-            max_retries = 2
-            retry_delay = 1
-            
-            for attempt in range(max_retries + 1):
-                try:
-                    batch_results, _ = self._run_parallax_search(
-                        query, batch, max_results, 
-                        mode_description=f"full_batch_{batch_idx + 1}"
-                    )
-                    return batch_results
-                    
-                except Exception as e:
-                    if attempt < max_retries:
-                        import time
-                        time.sleep(retry_delay)
-                        retry_delay *= 2
-                    else:
-                        return []
+            batch_results, _ = self._run_parallax_search(
+                query, batch, max_results, 
+                mode_description=f"full_batch_{batch_idx + 1}",
+                retries=config.FULL_SEARCH_RETRIES
+            )
+            return batch_results
         
         max_workers = min(3, len(batches))
         
@@ -97,35 +101,53 @@ class SearchEngine:
         
         return final_results, reasoning
 
-    def ai_search_hybrid(self, query: str, files: List[IndexedFile], top_k: int = 100, max_results: int = 20) -> Tuple[List[SearchResult], str]:
-        candidate_docs = self.semantic_search(query, files, top_k=top_k)
-        
-        if not candidate_docs:
-             return [], "No relevant files found by semantic search."
+    @staticmethod
+    def _mode_note(mode_description: str) -> str:
+        if mode_description == "hybrid":
+            return "You are seeing a subset of the most relevant files selected by a semantic search. Choose the best matching files from this subset."
+        if mode_description == "full":
+            return "You are seeing all indexed files."
+        return ""
+
+    @staticmethod
+    def _parse_json_response(content: str) -> dict:
+        if content.startswith("```json"):
+            content = content[7:]
+        elif content.startswith("```"):
+            content = content[3:]
+        if content.endswith("```"):
+            content = content[:-3]
+        return json.loads(content.strip())
 
-        return self._run_parallax_search(query, candidate_docs, max_results, mode_description="hybrid")
+    def _get_completion(self, messages: list, retries: int = 0) -> str:
+        # Retry transient model failures with exponential backoff
+        retry_delay = 1
+        for attempt in range(retries + 1):
+            try:
+                return self.parallax_client.get_completion(messages)
+            except Exception:
+                if attempt >= retries:
+                    raise
+                time.sleep(retry_delay)
+                retry_delay *= 2
 
-    def _run_parallax_search(self, query: str, files: List[IndexedFile], max_results: int, mode_description: str) -> Tuple[List[SearchResult], str]:
+    def _run_parallax_search(self, query: str, files: List[IndexedFile], max_results: int, mode_description: str,
+                             retries: int = 0) -> Tuple[List[SearchResult], str]:
         if not files:
             return [], "No files to search."
 
-        candidate_text = ""
-        for f in files:
-            preview = f.preview.replace('\n', ' ')[:config.PREVIEW_CHARS]
-            candidate_text += f"ID: {f.path}\nName: {f.name}\nPreview: {preview}\n\n"
+        candidate_text = "".join(f.candidate_block for f in files)
 
-        mode_note = ""
-        if mode_description == "hybrid":
-            mode_note = "You are seeing a subset of the most relevant files selected by a semantic search. Choose the best matching files from this subset."
-        elif mode_description == "full":
-            mode_note = "You are seeing all indexed files."
+        mode_note = self._mode_note(mode_description)
 
+        # Query-independent parts come first so the server's prefix cache can
+        # reuse the prefill of a batch across queries; the query goes last.
         user_content = (
-            f"QUERY: {query}\n\n"
-            f"CONTEXT: {mode_note}\n\n"
             f"CANDIDATES:\n{candidate_text}\n\n"
-            "Please select the files that are most relevant to the query. "
-            "Return the output as valid JSON."
+            f"CONTEXT: {mode_note}\n\n"
+            "Please select the files that are most relevant to the query below. "
+            "Return the output as valid JSON.\n\n"
+            f"QUERY: {query}"
         )
 
         messages = [
@@ -134,19 +156,12 @@ class SearchEngine:
         ]
 
         try:
-            content = self.parallax_client.get_completion(messages)
+            content = self._get_completion(messages, retries)
         except Exception as e:
             return [], str(e)
 
         try:
-            if content.startswith("```json"):
-                content = content[7:]
-            elif content.startswith("```"):
-                content = content[3:]
-            if content.endswith("```"):
-                content = content[:-3]
-            
-            parsed = json.loads(content.strip())
+            parsed = self._parse_json_response(content)
             ranked_ids = parsed.get("ranked", [])
             reasoning = parsed.get("reasoning", "No reasoning provided.")
             
@@ -166,12 +181,257 @@ class SearchEngine:
         except Exception as e:
             return [], f"Error processing results: {e}"
 
-    def search(self, query: str, index, mode="hybrid") -> Tuple[List[SearchResult], str]:
-        files = index 
-        
-        if mode == "full":
-            return self.ai_search_full(query, files)
-        elif mode == "hybrid":
-            return self.ai_search_hybrid(query, files)
+    @staticmethod
+    def _filter_only_results(files: List[IndexedFile], max_results: int) -> Tuple[List[SearchResult], str]:
+        # Filters only: newest matches first, no model call needed
+        newest = sorted(files, key=lambda f: f.modified_time, reverse=True)[:max_results]
+        results = [SearchResult(file=f, score=100.0 - i) for i, f in enumerate(newest)]
+        return results, f"{len(files)} files match the given filters."
+
+    def search(self, query: str, index, mode="hybrid", max_results: int = 20) -> Tuple[List[SearchResult], str]:
+        if mode not in ("full", "hybrid"):
+            raise ValueError(f"Unknown mode: {mode}")
+
+        sharded = isinstance(index, ShardedIndex)
+        all_files = index.files if sharded else index
+
+        try:
+            text, filters = parse_query(query)
+        except ValueError as e:
+            return [], str(e)
+        mask = self._metadata_columns(all_files).mask(filters) if filters else None
+        if mask is not None and not mask.any():
+            return [], "No indexed files match the given filters."
+
+        # Only one representative per duplicate cluster reaches ranking
+        duplicates = self._duplicate_index(all_files)
+        rep_mask = duplicates.representatives(mask)
+        files = [all_files[i] for i in rep_mask.nonzero()[0]]
+
+        if not text:
+            results, reasoning = self._filter_only_results(files, max_results)
+        elif mode == "full":
+            results, reasoning = self.ai_search_full(text, files, max_results=max_results)
+        elif sharded:
+            # Scatter-gather retrieval across the shard workers
+            self._sharded_duplicates(index, duplicates)
+            candidate_docs = index.semantic_search(text, top_k=config.HYBRID_TOP_K, mask=rep_mask if filters else None)
+            if not candidate_docs:
+                return [], "No relevant files found by semantic search."
+            results, reasoning = self._run_parallax_search(text, candidate_docs, max_results, mode_description="hybrid")
         else:
+            # Same cached per-index TF-IDF matrix as search_many, so both APIs
+            # retrieve identical candidates for the same query
+            positions = self._retrieve_many([text], [rep_mask], all_files, duplicates, config.HYBRID_TOP_K)[0]
+            if not positions:
+                return [], "No relevant files found by semantic search."
+            candidate_docs = [all_files[i] for i in positions]
+            results, reasoning = self._run_parallax_search(text, candidate_docs, max_results, mode_description="hybrid")
+
+        return duplicates.expand(results, mask), reasoning
+
+    def _retrieve_many(self, texts: List[str], masks: List[np.ndarray], files: List[IndexedFile],
+                       duplicates: DuplicateIndex, top_k: int) -> List[List[int]]:
+        """Top-k positions per query, scoring only the rows each query's mask keeps.
+
+        Queries with the same mask (e.g. all unfiltered ones) share one sparse
+        query x document product over the sliced matrix.
+        """
+        vectorizer, matrix = self._tfidf_index(files, duplicates)
+        top: List[List[int]] = [[] for _ in texts]
+        if matrix is None:
+            return top
+
+        query_matrix = vectorizer.transform(texts)
+        by_mask: Dict[bytes, List[int]] = {}
+        for qi, mask in enumerate(masks):
+            by_mask.setdefault(np.packbits(mask).tobytes(), []).append(qi)
+
+        for qis in by_mask.values():
+            rows = np.flatnonzero(masks[qis[0]])
+            if not len(rows):
+                continue
+            # Filters and duplicate collapsing apply before scoring. Rows are
+            # L2-normalised, so the dot product is the cosine similarity.
+            scores = (query_matrix[qis] @ matrix[rows].T).tocsr()
+            for row_idx, qi in enumerate(qis):
+                row = scores.getrow(row_idx)
+                keep = row.data > 0
+                idx, vals = row.indices[keep], row.data[keep]
+                if len(idx) > top_k:
+                    best = np.argpartition(vals, -top_k)[-top_k:]
+                    idx, vals = idx[best], vals[best]
+                top[qi] = rows[idx[np.argsort(-vals, kind="stable")]].tolist()
+        return top
+
+    @staticmethod
+    def _group_units(units: List[Tuple[int, str, List[int]]]) -> List[List[Tuple[int, str, List[int]]]]:
+        """Pack (query, text, candidates) units whose candidates overlap into shared requests."""
+        groups: List[Tuple[List[Tuple[int, str, List[int]]], set]] = []
+        for unit in units:
+            candidates = set(unit[2])
+            for members, pool in groups:
+                if len(members) >= config.SHARED_BATCH_MAX_QUERIES:
+                    continue
+                overlap = len(candidates & pool) / max(len(candidates), 1)
+                if overlap >= config.SHARED_BATCH_MIN_OVERLAP and len(candidates | pool) <= config.SHARED_BATCH_MAX_CANDIDATES:
+                    members.append(unit)
+                    pool |= candidates
+                    break
+            else:
+                groups.append(([unit], candidates))
+        return [members for members, _ in groups]
+
+    def _rank_group(self, group: List[Tuple[int, str, List[int]]], files: List[IndexedFile],
+                    allowed: Dict[int, np.ndarray], max_results: int, mode_description: str,
+                    retries: int = 0) -> List[Tuple[int, List[SearchResult], str]]:
+        """Rank one shared candidate pool for every query in the group with one model call."""
+        if len(group) == 1:
+            qi, text, positions = group[0]
+            results, reasoning = self._run_parallax_search(text, [files[i] for i in positions], max_results, mode_description, retries)
+            return [(qi, results, reasoning)]
+
+        # Candidates in index order so groups over the same files share a prefix
+        positions = sorted(set(p for _, _, unit_positions in group for p in unit_positions))
+        candidate_text = "".join(files[i].candidate_block for i in positions)
+        query_text = "\n".join(f"{n}. {text}" for n, (_, text, _) in enumerate(group, start=1))
+
+        user_content = (
+            f"CANDIDATES:\n{candidate_text}\n\n"
+            f"CONTEXT: {self._mode_note(mode_description)}\n\n"
+            "Please select, separately for each numbered query below, the files that are most relevant to it. "
+            "Return the output as valid JSON.\n\n"
+            f"QUERIES:\n{query_text}"
+        )
+        messages = [
+            {"role": "system", "content": config.PARALLAX_MULTI_QUERY_SYSTEM_PROMPT},
+            {"role": "user", "content": user_content}
+        ]
+
+        try:
+            parsed = self._parse_json_response(self._get_completion(messages, retries))
+            per_query = parsed.get("results", {})
+            if not isinstance(per_query, dict):
+                raise ValueError("'results' is not an object")
+
+            file_map = {files[i].path: i for i in positions}
+            outcomes = []
+            for n, (qi, _, _) in enumerate(group, start=1):
+                entry = per_query.get(str(n), {})
+                if not isinstance(entry, dict):
+                    raise ValueError(f"entry for query {n} is not an object")
+                ranked_ids = entry.get("ranked", [])
+                if not isinstance(ranked_ids, list):
+                    raise ValueError(f"'ranked' for query {n} is not a list")
+
+                results = []
+                score = 100.0
+                for rid in ranked_ids:
+                    pos = file_map.get(rid) if isinstance(rid, str) else None
+                    # The shared pool may hold files outside this query's filters
+                    if pos is not None and allowed[qi][pos]:
+                        results.append(SearchResult(file=files[pos], score=score))
+                        score -= 1.0
+                outcomes.append((qi, results[:max_results], entry.get("reasoning", "No reasoning provided.")))
+            return outcomes
+
+        except json.JSONDecodeError:
+            return [(qi, [], "Failed to parse response.") for qi, _, _ in group]
+        except Exception as e:
+            return [(qi, [], f"Error processing results: {e}") for qi, _, _ in group]
+
+    def search_many(self, queries: List[str], index, mode="hybrid", max_results: int = 20,
+                    top_k: int = config.HYBRID_TOP_K) -> List[Tuple[List[SearchResult], str]]:
+        """Run many queries at once; returns one (results, reasoning) pair per query.
+
+        Retrieval scores each chunk of queries with one sparse product, queries
+        whose candidates overlap share a model request, and model calls for a
+        chunk run while the next chunk is being retrieved.
+        """
+        if mode not in ("full", "hybrid"):
             raise ValueError(f"Unknown mode: {mode}")
+
+        sharded = isinstance(index, ShardedIndex)
+        all_files = index.files if sharded else index
+        duplicates = self._duplicate_index(all_files)
+        mode_description = "hybrid" if mode == "hybrid" else "full_batch"
+        # Same retry policy as search(): only full-search batches are retried
+        retries = config.FULL_SEARCH_RETRIES if mode == "full" else 0
+
+        outcomes: List[Optional[Tuple[List[SearchResult], str]]] = [None] * len(queries)
+        masks: Dict[int, Optional[np.ndarray]] = {}
+        allowed: Dict[int, np.ndarray] = {}
+        partial: Dict[int, List[Tuple[List[SearchResult], str]]] = {}
+        futures = []
+
+        with ThreadPoolExecutor(max_workers=config.SEARCH_MANY_WORKERS) as executor:
+            for start in range(0, len(queries), config.SEARCH_MANY_CHUNK):
+                pending = []
+                for qi in range(start, min(start + config.SEARCH_MANY_CHUNK, len(queries))):
+                    try:
+                        text, filters = parse_query(queries[qi])
+                    except ValueError as e:
+                        # A malformed filter only fails its own query
+                        outcomes[qi] = ([], str(e))
+                        continue
+                    mask = self._metadata_columns(all_files).mask(filters) if filters else None
+                    if mask is not None and not mask.any():
+                        outcomes[qi] = ([], "No indexed files match the given filters.")
+                        continue
+                    masks[qi] = mask
+                    allowed[qi] = duplicates.representatives(mask)
+                    if not text:
+                        files = [all_files[i] for i in allowed[qi].nonzero()[0]]
+                        results, reasoning = self._filter_only_results(files, max_results)
+                        outcomes[qi] = (duplicates.expand(results, mask), reasoning)
+                        continue
+                    pending.append((qi, text))
+
+                if not pending:
+                    continue
+
+                units = []
+                if mode == "full":
+                    # Same fixed batches as ai_search_full, so equal filters mean equal pools
+                    size = config.FULL_SEARCH_BATCH_SIZE
+                    for qi, text in pending:
+                        positions = allowed[qi].nonzero()[0].tolist()
+                        if not positions:
+                            outcomes[qi] = ([], "No files to search.")
+                            continue
+                        units.extend((qi, text, positions[i:i + size]) for i in range(0, len(positions), size))
+                else:
+                    texts = [text for _, text in pending]
+                    rep_masks = [allowed[qi] for qi, _ in pending]
+                    if sharded:
+                        self._sharded_duplicates(index, duplicates)
+                        shard_masks = [allowed[qi] if masks[qi] is not None else None for qi, _ in pending]
+                        top = index.semantic_search_many(texts, top_k=top_k, masks=shard_masks)
+                    else:
+                        top = self._retrieve_many(texts, rep_masks, all_files, duplicates, top_k)
+                    for (qi, text), positions in zip(pending, top):
+                        if positions:
+                            units.append((qi, text, positions))
+                        else:
+                            outcomes[qi] = ([], "No relevant files found by semantic search.")
+
+                for qi, _, _ in units:
+                    partial[qi] = []
+                for group in self._group_units(units):
+                    futures.append(executor.submit(self._rank_group, group, all_files, allowed, max_results, mode_description, retries))
+
+            for future in futures:
+                for qi, results, reasoning in future.result():
+                    partial[qi].append((results, reasoning))
+
+        for qi, parts in partial.items():
+            results = sorted((r for part, _ in parts for r in part), key=lambda r: r.score, reverse=True)[:max_results]
+            if len(parts) == 1:
+                reasoning = parts[0][1]
+            else:
+                searched = int(allowed[qi].sum())
+                found = f"found {len(results)} highly relevant matches" if results else "found no relevant matches"
+                reasoning = f"Searched {searched} files and {found} for your query."
+            outcomes[qi] = (duplicates.expand(results, masks[qi]), reasoning)
+
+        return outcomes
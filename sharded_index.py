@@ -0,0 +1,277 @@
+"""
+sharded_index.py - Multi-root index split into shards queried by worker processes
+"""
+
+import os
+import heapq
+import threading
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+from sklearn.feature_extraction.text import TfidfVectorizer
+
+from models import IndexedFile
+from indexer import FileIndexer
+import config
+
+# Worker-process state: shard_id -> (vectorizer, tfidf matrix). Lives in the
+# worker so queries only ship the query string, never the documents.
+_WORKER_SHARDS: Dict[int, Tuple[TfidfVectorizer, object]] = {}
+# shard_id -> local indices hidden from unfiltered queries (duplicate copies)
+_WORKER_HIDDEN: Dict[int, np.ndarray] = {}
+
+
+def _index_root(root: str) -> List[IndexedFile]:
+    indexer = FileIndexer()
+    indexer.set_root_path(root)
+    return indexer.index_files()
+
+
+def _load_shard(shard_id: int, texts: List[str]) -> int:
+    vectorizer = TfidfVectorizer()
+    try:
+        matrix = vectorizer.fit_transform(texts)
+    except ValueError:
+        matrix = None
+    _WORKER_SHARDS[shard_id] = (vectorizer, matrix)
+    return shard_id
+
+
+def _drop_shard(shard_id: int) -> None:
+    _WORKER_SHARDS.pop(shard_id, None)
+    _WORKER_HIDDEN.pop(shard_id, None)
+
+
+def _set_hidden(hidden: Dict[int, np.ndarray]) -> None:
+    _WORKER_HIDDEN.clear()
+    _WORKER_HIDDEN.update(hidden)
+
+
+def _top_hits(row, top_k: int, hidden: Optional[np.ndarray]) -> Tuple[np.ndarray, np.ndarray]:
+    """Top-k (column, score) pairs of one sparse score row."""
+    idx, scores = row.indices, row.data
+    if hidden is not None and len(hidden):
+        keep = ~np.isin(idx, hidden)
+        idx, scores = idx[keep], scores[keep]
+    keep = scores > 0
+    idx, scores = idx[keep], scores[keep]
+    if len(idx) > top_k:
+        best = np.argpartition(scores, -top_k)[-top_k:]
+        idx, scores = idx[best], scores[best]
+    return idx, scores
+
+
+def _query_shards_many(queries: List[str], top_k: int, allowed: List[Optional[Dict[int, np.ndarray]]]) -> List[List[Tuple[float, int, int]]]:
+    hits: List[List[Tuple[float, int, int]]] = [[] for _ in queries]
+    for shard_id, (vectorizer, matrix) in _WORKER_SHARDS.items():
+        if matrix is None:
+            continue
+        unfiltered = [qi for qi, a in enumerate(allowed) if a is None]
+        filtered = [qi for qi, a in enumerate(allowed) if a is not None and shard_id in a]
+        if not unfiltered and not filtered:
+            continue
+        query_matrix = vectorizer.transform([queries[qi] for qi in unfiltered + filtered])
+
+        # Rows are L2-normalised, so the dot product is the cosine similarity.
+        # Unfiltered queries share one product over the whole shard.
+        if unfiltered:
+            scores = (query_matrix[:len(unfiltered)] @ matrix.T).tocsr()
+            for row_idx, qi in enumerate(unfiltered):
+                idx, vals = _top_hits(scores.getrow(row_idx), top_k, _WORKER_HIDDEN.get(shard_id))
+                hits[qi].extend((float(v), shard_id, int(i)) for i, v in zip(idx, vals))
+
+        # Filtered queries only score the rows their filters keep
+        for offset, qi in enumerate(filtered, start=len(unfiltered)):
+            rows = allowed[qi][shard_id]
+            scores = (query_matrix[offset] @ matrix[rows].T).tocsr()
+            idx, vals = _top_hits(scores.getrow(0), top_k, None)
+            hits[qi].extend((float(v), shard_id, int(rows[i])) for i, v in zip(idx, vals))
+    return hits
+
+
+@dataclass
+class IndexShard:
+    shard_id: int
+    root: str
+    files: List[IndexedFile]
+    worker: int
+
+
+class ShardedIndex:
+    """Index made of independent shards, each held by one worker process.
+
+    Shards are created per root (split every ``shard_size`` files) and can be
+    added or removed without touching the others. Retrieval scatters the query
+    to every worker and merges the per-shard top-k.
+    """
+
+    def __init__(self, max_workers: Optional[int] = None, shard_size: int = config.SHARD_MAX_FILES):
+        self.max_workers = max_workers or config.SHARD_WORKERS or os.cpu_count() or 1
+        self.shard_size = shard_size
+        self._workers: List[ProcessPoolExecutor] = []
+        self._shards: Dict[int, IndexShard] = {}
+        self._next_id = 0
+        self._files: Optional[List[IndexedFile]] = None
+        self._lock = threading.Lock()
+        self.hidden_for: Optional[List[IndexedFile]] = None
+
+    def __len__(self) -> int:
+        return sum(len(s.files) for s in self._shards.values())
+
+    @property
+    def shards(self) -> List[IndexShard]:
+        return list(self._shards.values())
+
+    @property
+    def roots(self) -> List[str]:
+        return list(dict.fromkeys(s.root for s in self._shards.values()))
+
+    @property
+    def files(self) -> List[IndexedFile]:
+        # Cached so callers can rely on identity until the shard set changes
+        if self._files is None:
+            self._files = [f for s in self._shards.values() for f in s.files]
+        return self._files
+
+    def _pick_worker(self, assigned: List[IndexShard]) -> int:
+        if len(self._workers) < self.max_workers:
+            self._workers.append(ProcessPoolExecutor(max_workers=1))
+            return len(self._workers) - 1
+        # Count shards placed earlier in the same call too; they are not in
+        # self._shards until their load futures finish
+        load = [0] * len(self._workers)
+        for shard in list(self._shards.values()) + assigned:
+            load[shard.worker] += len(shard.files)
+        return load.index(min(load))
+
+    def add_roots(self, roots: List[str], progress_callback: Optional[Callable[[str], None]] = None) -> List[int]:
+        roots = [r for r in roots if r and os.path.isdir(r)]
+        if not roots:
+            return []
+
+        shard_ids = []
+        with ProcessPoolExecutor(max_workers=min(self.max_workers, len(roots))) as pool:
+            futures = {pool.submit(_index_root, root): root for root in roots}
+            for future in as_completed(futures):
+                root = futures[future]
+                files = future.result()
+                shard_ids.extend(self.add_files(root, files))
+                if progress_callback:
+                    progress_callback(f"Indexed {root}: {len(files)} files")
+
+        if progress_callback:
+            progress_callback(f"Indexing complete: {len(self)} files found.")
+        return shard_ids
+
+    def add_files(self, root: str, files: List[IndexedFile]) -> List[int]:
+        pending = []
+        with self._lock:
+            for start in range(0, len(files), self.shard_size):
+                chunk = files[start:start + self.shard_size]
+                shard = IndexShard(self._next_id, root, chunk, self._pick_worker([p[0] for p in pending]))
+                self._next_id += 1
+                texts = [f.search_text() for f in chunk]
+                pending.append((shard, self._workers[shard.worker].submit(_load_shard, shard.shard_id, texts)))
+
+        for shard, future in pending:
+            future.result()
+        with self._lock:
+            for shard, _ in pending:
+                self._shards[shard.shard_id] = shard
+            self._files = None
+        return [shard.shard_id for shard, _ in pending]
+
+    def remove_shard(self, shard_id: int) -> None:
+        with self._lock:
+            shard = self._shards.pop(shard_id, None)
+            self._files = None
+        if shard:
+            self._workers[shard.worker].submit(_drop_shard, shard_id).result()
+
+    def remove_root(self, root: str) -> None:
+        for shard in [s for s in self._shards.values() if s.root == root]:
+            self.remove_shard(shard.shard_id)
+
+    def clear(self) -> None:
+        for shard_id in list(self._shards):
+            self.remove_shard(shard_id)
+
+    def close(self) -> None:
+        with self._lock:
+            self._shards.clear()
+            self._files = None
+            for worker in self._workers:
+                worker.shutdown(wait=False)
+            self._workers = []
+
+    def set_hidden(self, hidden: np.ndarray) -> None:
+        """Push a mask of files (aligned with ``files``) that unfiltered queries skip.
+
+        Sent to the workers once, e.g. duplicate copies, so queries without a
+        ``mask`` still only ship the query string.
+        """
+        with self._lock:
+            files = self.files
+            per_worker: List[Dict[int, np.ndarray]] = [{} for _ in self._workers]
+            offset = 0
+            for shard_id, shard in self._shards.items():
+                local = np.flatnonzero(hidden[offset:offset + len(shard.files)])
+                offset += len(shard.files)
+                if len(local):
+                    per_worker[shard.worker][shard_id] = local
+            futures = [worker.submit(_set_hidden, part) for worker, part in zip(self._workers, per_worker)]
+        for future in futures:
+            future.result()
+        self.hidden_for = files
+
+    def semantic_search(self, query: str, top_k: int = 100, mask: Optional[np.ndarray] = None) -> List[IndexedFile]:
+        """Scatter the query to all workers and merge the per-shard top-k.
+
+        ``mask`` is an optional boolean array aligned with ``files`` (see
+        ``query_filters.MetadataColumns``) restricting which files may match.
+        Without it, files hidden through ``set_hidden`` are skipped.
+        """
+        files = self.files
+        return [files[i] for i in self.semantic_search_many([query], top_k, [mask])[0]]
+
+    def semantic_search_many(self, queries: List[str], top_k: int = 100,
+                             masks: Optional[List[Optional[np.ndarray]]] = None) -> List[List[int]]:
+        """Batch form of ``semantic_search``; returns positions into ``files``."""
+        with self._lock:
+            shards = dict(self._shards)
+            workers = list(self._workers)
+        masks = masks or [None] * len(queries)
+        if not shards or not queries:
+            return [[] for _ in queries]
+
+        offsets = {}
+        offset = 0
+        for shard_id, shard in shards.items():
+            offsets[shard_id] = offset
+            offset += len(shard.files)
+
+        allowed: List[Optional[Dict[int, np.ndarray]]] = []
+        for mask in masks:
+            if mask is None:
+                allowed.append(None)
+                continue
+            per_shard = {}
+            for shard_id, shard in shards.items():
+                start = offsets[shard_id]
+                local = np.flatnonzero(mask[start:start + len(shard.files)])
+                if len(local):
+                    per_shard[shard_id] = local
+            allowed.append(per_shard)
+
+        futures = [worker.submit(_query_shards_many, queries, top_k, allowed) for worker in workers]
+        hits: List[List[Tuple[float, int, int]]] = [[] for _ in queries]
+        for future in futures:
+            for qi, query_hits in enumerate(future.result()):
+                hits[qi].extend(query_hits)
+
+        return [
+            [offsets[shard_id] + idx for _, shard_id, idx in heapq.nlargest(top_k, query_hits) if shard_id in offsets]
+            for query_hits in hits
+        ]
@@ -6,6 +6,7 @@ import ctypes
 import config
 from indexer import FileIndexer
 from search_engine import SearchEngine
+from sharded_index import ShardedIndex
 
 try:
     myappid = 'parallax.filefinder.v1'
@@ -27,6 +28,7 @@ class MainFrame(wx.Frame):
 
         self.indexer = FileIndexer()
         self.search_engine = SearchEngine()
+        self.index = ShardedIndex()
         self.indexed_files = []
         
         self.init_ui()
@@ -84,7 +86,7 @@ class MainFrame(wx.Frame):
         self.txt_search.SetBackgroundColour(config.THEME["panel_bg"])
         self.txt_search.SetForegroundColour(config.THEME["text"])
         self.txt_search.SetFont(wx.Font(12, wx.FONTFAMILY_DEFAULT, wx.FONTSTYLE_NORMAL, wx.FONTWEIGHT_NORMAL, False, config.FONT_FAMILY))
-        self.txt_search.SetHint("Type your search query...")
+        self.txt_search.SetHint("Type your search query... (filters: ext:py size:>1MB modified:<7d path:src/**)")
         self.txt_search.Bind(wx.EVT_TEXT_ENTER, self.on_search)
         content_sizer.Add(self.txt_search, flag=wx.ALIGN_CENTER|wx.BOTTOM, border=15)
         
@@ -171,8 +173,9 @@ class MainFrame(wx.Frame):
         # Get the widget that sent the event
         obj = event.GetEventObject()
         
-        # If a label was clicked, use its parent panel
-        if isinstance(obj, wx.StaticText):
+        # If a label was clicked, use its parent panel unless the label
+        # carries its own path (duplicate copies)
+        if isinstance(obj, wx.StaticText) and not hasattr(obj, 'file_path'):
             panel = obj.GetParent()
         else:
             panel = obj
@@ -197,29 +200,37 @@ class MainFrame(wx.Frame):
         dlg.Destroy()
 
     def on_index(self, event):
-        root = self.txt_root_path.GetValue().strip()
-        if not root or not os.path.isdir(root):
-            self.log(f"ERROR: Invalid folder path: {root}")
+        # Several folders can be indexed at once, separated by os.pathsep
+        roots = [r.strip() for r in self.txt_root_path.GetValue().split(os.pathsep) if r.strip()]
+        invalid = [r for r in roots if not os.path.isdir(r)]
+        if not roots or invalid:
+            self.log(f"ERROR: Invalid folder path: {', '.join(invalid)}")
             wx.MessageBox("Invalid folder.", "Error", wx.OK | wx.ICON_ERROR)
             return
 
-        self.log(f"Starting indexing process for: {root}")
+        self.log(f"Starting indexing process for: {', '.join(roots)}")
         self.lbl_status.SetLabel("Indexing files...")
         self.btn_index.Disable()
         self.timer.Start(100)
-        threading.Thread(target=self._indexing_worker, args=(root,), daemon=True).start()
+        threading.Thread(target=self._indexing_worker, args=(roots,), daemon=True).start()
 
-    def _indexing_worker(self, root):
+    def _indexing_worker(self, roots):
         def progress_update(msg):
             wx.CallAfter(self.lbl_status.SetLabel, msg)
             # Also log to activity log if it contains file count
             if "files" in msg.lower():
                 wx.CallAfter(self.log, msg)
         
-        self.indexer.set_root_path(root)
-        files = self.indexer.index_files(progress_callback=progress_update)
-        self.indexed_files = files
-        wx.CallAfter(self._indexing_finished, len(files))
+        try:
+            self.index.clear()
+            self.index.add_roots(roots, progress_callback=progress_update)
+            files = self.index.files
+            self.indexed_files = files
+            wx.CallAfter(self._indexing_finished, len(files))
+        except Exception as e:
+            # Keep the UI in sync with whatever shards survived the failure
+            self.indexed_files = self.index.files
+            wx.CallAfter(self._indexing_error, str(e))
 
     def _indexing_finished(self, count):
         self.timer.Stop()
@@ -228,6 +239,14 @@ class MainFrame(wx.Frame):
         self.lbl_status.SetLabel(f"Indexed {count} files. Ready.")
         self.log(f"Indexing complete: {count} files indexed")
 
+    def _indexing_error(self, error_msg):
+        self.timer.Stop()
+        self.gauge.SetValue(0)
+        self.btn_index.Enable()
+        self.lbl_status.SetLabel("Indexing failed.")
+        self.log(f"ERROR: Indexing failed - {error_msg}")
+        wx.MessageBox(f"Indexing Error:\n{error_msg}", "Error", wx.OK|wx.ICON_ERROR)
+
     def on_save_index(self, event):
         if not self.indexed_files:
             self.log("No index to save")
@@ -237,7 +256,7 @@ class MainFrame(wx.Frame):
         if dlg.ShowModal() == wx.ID_OK:
             filepath = dlg.GetPath()
             try:
-                self.indexer.save_index(filepath)
+                self.indexer.save_index(filepath, self.indexed_files)
                 self.lbl_status.SetLabel("Index saved successfully.")
                 self.log(f"Index saved to: {filepath}")
                 wx.MessageBox("Index saved successfully.", "Success", wx.OK)
@@ -252,7 +271,9 @@ class MainFrame(wx.Frame):
             filepath = dlg.GetPath()
             try:
                 files = self.indexer.load_index(filepath)
-                self.indexed_files = files
+                self.index.clear()
+                self.index.add_files(filepath, files)
+                self.indexed_files = self.index.files
                 self.lbl_status.SetLabel(f"Successfully loaded {len(files)} files.")
                 self.log(f"Loaded index from: {filepath} ({len(files)} files)")
                 wx.MessageBox(f"Successfully loaded {len(files)} files from index.", "Success", wx.OK)
@@ -306,7 +327,7 @@ class MainFrame(wx.Frame):
         # Notify (via UI thread) that the background worker has started
         wx.CallAfter(self.log, f"Background worker started for '{mode}' search")
         try:
-            results, reasoning = self.search_engine.search(query, self.indexed_files, mode=mode)
+            results, reasoning = self.search_engine.search(query, self.index, mode=mode)
             wx.CallAfter(self._search_finished, results, reasoning)
         except Exception as e:
             wx.CallAfter(self._search_error, str(e))
@@ -363,6 +384,21 @@ class MainFrame(wx.Frame):
             lbl_path.Bind(wx.EVT_LEFT_DOWN, self.on_result_click)  # Also bind to label
             sizer.Add(lbl_path, flag=wx.LEFT|wx.RIGHT, border=10)
             
+            if res.duplicates:
+                lbl_dups = wx.StaticText(result_panel, label=f"Also at ({len(res.duplicates)}):")
+                lbl_dups.SetFont(wx.Font(8, wx.FONTFAMILY_DEFAULT, wx.FONTSTYLE_NORMAL, wx.FONTWEIGHT_BOLD, False, config.FONT_FAMILY))
+                lbl_dups.SetForegroundColour(config.THEME["text_dim"])
+                sizer.Add(lbl_dups, flag=wx.LEFT|wx.RIGHT|wx.TOP, border=10)
+                
+                for dup in res.duplicates:
+                    # Each copy carries its own path so clicking opens that copy
+                    lbl_dup = wx.StaticText(result_panel, label=dup.path)
+                    lbl_dup.SetFont(wx.Font(8, wx.FONTFAMILY_DEFAULT, wx.FONTSTYLE_NORMAL, wx.FONTWEIGHT_NORMAL, False, config.FONT_FAMILY))
+                    lbl_dup.SetForegroundColour(config.THEME["text_dim"])
+                    lbl_dup.file_path = dup.path
+                    lbl_dup.Bind(wx.EVT_LEFT_DOWN, self.on_result_click)
+                    sizer.Add(lbl_dup, flag=wx.LEFT|wx.RIGHT, border=20)
+            
             preview_text = res.file.preview[:150] + "..." if len(res.file.preview) > 150 else res.file.preview
             lbl_preview = wx.StaticText(result_panel, label=preview_text)
             lbl_preview.SetFont(wx.Font(9, wx.FONTFAMILY_DEFAULT, wx.FONTSTYLE_ITALIC, wx.FONTWEIGHT_NORMAL, False, config.FONT_FAMILY))